@@ -0,0 +1,8 @@
+# setup.py
+# Description: Builds the optional C multiplication kernel used by sparse_matrix.py.
+# Usage: python setup.py build_ext --inplace
+
+from Cython.Build import cythonize
+from setuptools import setup
+
+setup(ext_modules=cythonize("_kernels.pyx"))
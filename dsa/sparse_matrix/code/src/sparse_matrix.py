@@ -4,28 +4,221 @@
 # Description: Implementation of a Sparse Matrix class for DSA-HW01 assignment.
 # This code reads sparse matrices from files, performs addition, subtraction, and multiplication.
 
+import re
+
+import numpy as np
+
+try:
+    from numba import get_num_threads, njit, prange
+    _HAVE_NUMBA = True
+except ImportError:  # Numba is optional; multiply then uses _spgemm_csr_py
+    _HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+
+try:
+    import _kernels  # Optional C kernel, built with: python setup.py build_ext --inplace
+except ImportError:
+    _kernels = None
+
+# The "rows=<num>" and "cols=<num>" header lines, with any blank lines around them
+_HEADER_RE = re.compile(r"\s*rows=[ \t]*(\d+)\s*\n\s*cols=[ \t]*(\d+)\s*")
+_PARSE_CHUNK_SIZE = 1 << 20  # Characters of input parsed per loadtxt pass
+
+# Structure kinds returned by SparseMatrix._classify()
+_DIAG = "diagonal"  # Entries only on the main diagonal
+_PERMUTATION = "permutation"  # At most one entry per row and per column
+_GENERAL = "general"
+
+
+def _merge_coo(r, c, v):
+    """Sort COO arrays by (row, col), sum duplicate entries and drop zeros.
+
+    Returns:
+        tuple: Deduplicated (rows, cols, vals) arrays in row-major order.
+    """
+    if len(v) == 0:
+        return r, c, v
+    order = np.lexsort((c, r))
+    r, c, v = r[order], c[order], v[order]
+    new_grp = np.empty(len(r), dtype=bool)
+    new_grp[0] = True
+    new_grp[1:] = (r[1:] != r[:-1]) | (c[1:] != c[:-1])
+    starts = np.nonzero(new_grp)[0]
+    summed = np.add.reduceat(v, starts)
+    keep = summed != 0
+    return r[starts][keep], c[starts][keep], summed[keep]
+
+
+@njit(parallel=True, cache=True, boundscheck=False)
+def _spgemm_csr(a_rp, a_ci, a_v, b_rp, b_ci, b_v, n_cols, n_chunks):
+    """Multiply two CSR matrices with Gustavson's algorithm.
+
+    Rows of the result are independent, so they are split into n_chunks
+    contiguous chunks processed in parallel, each with its own accumulator buffers.
+    A symbolic pass counts the non-zeros of each result row so the output can
+    be allocated exactly; the numeric pass then fills each row in place at its
+    offset, with the output columns doubling as the touched-column stack.
+
+    Returns:
+        tuple: (row_ptr, col_idx, vals) of the product, columns sorted per row.
+        Entries that cancel to zero are kept and must be dropped by the caller.
+    """
+    n_rows = len(a_rp) - 1
+
+    row_nnz = np.zeros(n_rows + 1, dtype=np.int64)
+    for t in prange(n_chunks):
+        mark = np.full(n_cols, -1, dtype=b_ci.dtype)
+        for i in range(t * n_rows // n_chunks, (t + 1) * n_rows // n_chunks):
+            count = 0
+            for kk in range(a_rp[i], a_rp[i + 1]):
+                k = a_ci[kk]
+                for jj in range(b_rp[k], b_rp[k + 1]):
+                    j = b_ci[jj]
+                    if mark[j] != i:
+                        mark[j] = i
+                        count += 1
+            row_nnz[i + 1] = count
+    row_ptr = np.cumsum(row_nnz)
+
+    nnz = row_ptr[n_rows]
+    out_col = np.empty(nnz, dtype=b_ci.dtype)
+    out_val = np.empty(nnz, dtype=np.int64)
+    for t in prange(n_chunks):
+        mark = np.full(n_cols, -1, dtype=b_ci.dtype)
+        acc = np.zeros(n_cols, dtype=np.int64)
+        for i in range(t * n_rows // n_chunks, (t + 1) * n_rows // n_chunks):
+            start = row_ptr[i]
+            pos = start
+            for kk in range(a_rp[i], a_rp[i + 1]):
+                k = a_ci[kk]
+                a = a_v[kk]
+                for jj in range(b_rp[k], b_rp[k + 1]):
+                    j = b_ci[jj]
+                    if mark[j] != i:
+                        mark[j] = i
+                        out_col[pos] = j
+                        pos += 1
+                    acc[j] += a * b_v[jj]
+            out_col[start:pos].sort()
+            for p in range(start, pos):
+                j = out_col[p]
+                out_val[p] = acc[j]
+                acc[j] = 0
+    return row_ptr, out_col, out_val
+
+
+def _spgemm_csr_py(a_rp, a_ci, a_v, b_rp, b_ci, b_v):
+    """Pure-Python counterpart of _spgemm_csr, used when Numba is unavailable.
+
+    Loops are ordered i-k-j so each row of B is streamed as one contiguous
+    CSR slice into a per-row dict accumulator, working on Python lists
+    rather than indexing NumPy arrays one scalar at a time.
+
+    Returns:
+        tuple: (row_ptr, col_idx, vals) in the same form as _spgemm_csr.
+    """
+    col_dtype = b_ci.dtype
+    a_rp, a_ci, a_v, b_rp, b_ci, b_v = (arr.tolist() for arr in (a_rp, a_ci, a_v, b_rp, b_ci, b_v))
+    row_ptr = [0]
+    out_col, out_val = [], []
+    for i in range(len(a_rp) - 1):
+        acc = {}
+        for kk in range(a_rp[i], a_rp[i + 1]):
+            k, a = a_ci[kk], a_v[kk]
+            for jj in range(b_rp[k], b_rp[k + 1]):
+                j = b_ci[jj]
+                acc[j] = acc.get(j, 0) + a * b_v[jj]
+        for j in sorted(acc):
+            out_col.append(j)
+            out_val.append(acc[j])
+        row_ptr.append(len(out_col))
+    return (np.array(row_ptr, dtype=np.int64), np.array(out_col, dtype=col_dtype),
+            np.array(out_val, dtype=np.int64))
+
 
 class SparseMatrix:
-    def __init__(self, matrix_file_path=None, num_rows=None, num_cols=None):
+    def __init__(self, matrix_file_path=None, num_rows=None, num_cols=None, index_dtype=np.int32):
         """Initialize SparseMatrix either by loading from a file or creating an empty matrix.
         
         Args:
             matrix_file_path (str, optional): Path to the input file.
             num_rows (int, optional): Number of rows for an empty matrix.
             num_cols (int, optional): Number of columns for an empty matrix.
+            index_dtype (numpy dtype, optional): Integer type of the row and column
+                indices. Defaults to int32, which halves index memory traffic.
         
         Raises:
-            ValueError: If file cannot be opened or format is invalid.
+            ValueError: If file cannot be opened, format is invalid, or the
+                dimensions do not fit in index_dtype.
         """
-        self.elements = []  # List of tuples (row, col, value) for non-zero elements
+        # Non-zero elements in COO form, one parallel array per field
+        self.index_dtype = np.dtype(index_dtype)
+        self.rows_idx = np.empty(0, dtype=self.index_dtype)
+        self.cols_idx = np.empty(0, dtype=self.index_dtype)
+        self.vals = np.empty(0, dtype=np.int64)
+        self._csr_cache = None  # (row_ptr, col_idx, vals), rebuilt lazily after writes
+        self._index = None  # {(row, col): position in the arrays}, built lazily on first write
+        self._keys = None  # Sorted row * cols + col per element, while the arrays are in that order
+        self._is_coalesced = True  # No duplicate coordinates or explicit zeros
+        self._buffers = None  # Over-allocated (rows, cols, vals) storage used by _append
         if matrix_file_path:
             self._load_from_file(matrix_file_path)
         elif num_rows is not None and num_cols is not None:
             self.rows = num_rows
             self.cols = num_cols
+            self._check_dimensions()
         else:
             raise ValueError("Must provide either file path or dimensions")
 
+    @classmethod
+    def from_arrays(cls, rows_idx, cols_idx, vals, shape):
+        """Build a matrix directly from COO arrays, without copying them.
+
+        The arrays are used as given, not copied, so set_element may modify
+        them in place. Values of another integer type are converted to int64,
+        which does copy them. Duplicate coordinates and explicit zeros are allowed
+        and are coalesced when first needed.
+
+        Args:
+            rows_idx (numpy.ndarray): Row index of each element.
+            cols_idx (numpy.ndarray): Column index of each element, same dtype as rows_idx.
+            vals (numpy.ndarray): Integer value of each element, castable to int64.
+            shape (tuple): (num_rows, num_cols) of the matrix.
+
+        Raises:
+            ValueError: If the arrays have mismatched lengths or dtypes, the
+                values do not fit in int64, or an index is out of bounds.
+
+        Returns:
+            SparseMatrix: Matrix backed by the given arrays.
+        """
+        rows_idx, cols_idx, vals = np.asarray(rows_idx), np.asarray(cols_idx), np.asarray(vals)
+        if not (rows_idx.ndim == cols_idx.ndim == vals.ndim == 1
+                and len(rows_idx) == len(cols_idx) == len(vals)):
+            raise ValueError("Index and value arrays must be one-dimensional and of equal length")
+        if (rows_idx.dtype != cols_idx.dtype or not np.issubdtype(rows_idx.dtype, np.integer)
+                or not np.issubdtype(vals.dtype, np.integer)):
+            raise ValueError("Index arrays must share an integer dtype and values must be integers")
+        if not np.can_cast(vals.dtype, np.int64):
+            raise ValueError("Values must fit in int64")
+        vals = vals.astype(np.int64, copy=False)
+        matrix = cls(num_rows=shape[0], num_cols=shape[1], index_dtype=rows_idx.dtype)
+        if len(vals) and not (rows_idx.min() >= 0 and rows_idx.max() < matrix.rows
+                              and cols_idx.min() >= 0 and cols_idx.max() < matrix.cols):
+            raise ValueError("Invalid row or column index")
+        matrix.rows_idx, matrix.cols_idx, matrix.vals = rows_idx, cols_idx, vals
+        matrix._is_coalesced = False
+        return matrix
+
+    def _check_dimensions(self):
+        """Ensure every row and column index fits in the index dtype."""
+        if max(self.rows, self.cols) > np.iinfo(self.index_dtype).max:
+            raise ValueError("Matrix dimensions too large for index type")
+
     def _load_from_file(self, matrix_file_path):
         """Load sparse matrix data from a file with custom parsing.
         
@@ -35,30 +228,61 @@ class SparseMatrix:
         matrix_file_path = matrix_file_path.strip()  # Ensure no leading/trailing spaces
         try:
             with open(matrix_file_path, 'r') as file:
-                lines = [line.strip() for line in file if line.strip()]  # Remove empty lines and whitespace
-                if len(lines) < 2:
-                    raise ValueError("Input file has wrong format")
-
-                # Parse rows and cols
-                if not lines[0].startswith("rows=") or not lines[1].startswith("cols="):
+                # Parse rows and cols from the first two non-blank lines
+                header, found = [], 0
+                while found < 2:
+                    line = file.readline()
+                    if not line:
+                        raise ValueError("Input file has wrong format")
+                    header.append(line)
+                    found += bool(line.strip())
+                match = _HEADER_RE.fullmatch("".join(header))
+                if not match:
                     raise ValueError("Input file has wrong format")
-                self.rows = int(lines[0][5:])
-                self.cols = int(lines[1][5:])
+                self.rows = int(match[1])
+                self.cols = int(match[2])
+                self._check_dimensions()
 
-                # Parse non-zero elements
-                for line in lines[2:]:
-                    if not line or line[0] != '(' or line[-1] != ')':
-                        raise ValueError("Input file has wrong format")
-                    content = line[1:-1].split(',')
-                    if len(content) != 3:
-                        raise ValueError("Input file has wrong format")
+                # Parse the non-zero elements a chunk of lines at a time into
+                # buffers that double when full, so the whole file is never held
+                # in memory; every non-blank line must be one "(row, col, value)"
+                buffers = (np.empty(1024, dtype=self.index_dtype), np.empty(1024, dtype=self.index_dtype),
+                           np.empty(1024, dtype=np.int64))
+                n = 0
+                while True:
+                    lines = file.readlines(_PARSE_CHUNK_SIZE)
+                    if not lines:
+                        break
+                    fields = []
+                    for line in lines:
+                        line = line.strip()
+                        if line:
+                            if line[0] != "(" or line[-1] != ")":
+                                raise ValueError("Input file has wrong format")
+                            fields.append(line[1:-1])
+                    if not fields:
+                        continue
+                    # loadtxt's C tokenizer rejects blank, non-integer and out-of-range fields
                     try:
-                        row, col, value = map(int, content)
-                        if not (0 <= row < self.rows and 0 <= col < self.cols):
-                            raise ValueError("Invalid row or column index")
-                        self.elements.append((row, col, value))
+                        entries = np.loadtxt(fields, dtype=np.int64, delimiter=",", comments=None, ndmin=2)
                     except ValueError:
                         raise ValueError("Input file has wrong format")
+                    if entries.shape[1] != 3 or not (
+                            ((0 <= entries[:, 0]) & (entries[:, 0] < self.rows)).all()
+                            and ((0 <= entries[:, 1]) & (entries[:, 1] < self.cols)).all()):
+                        raise ValueError("Input file has wrong format")
+                    if n + len(entries) > len(buffers[0]):
+                        capacity = max(2 * len(buffers[0]), n + len(entries))
+                        grown = tuple(np.empty(capacity, dtype=buf.dtype) for buf in buffers)
+                        for new, old in zip(grown, buffers):
+                            new[:n] = old[:n]
+                        buffers = grown
+                    for buf, column in zip(buffers, entries.T):
+                        buf[n:n + len(entries)] = column
+                    n += len(entries)
+            self.rows_idx, self.cols_idx, self.vals = (buf[:n] for buf in buffers)
+            self._is_coalesced = False
+            self._coalesce()
         except FileNotFoundError:
             raise ValueError("Cannot open file")
 
@@ -74,10 +298,14 @@ class SparseMatrix:
         """
         if not (0 <= curr_row < self.rows and 0 <= curr_col < self.cols):
             raise ValueError("Invalid row or column")
-        for row, col, value in self.elements:
-            if row == curr_row and col == curr_col:
-                return value
-        return 0
+        if self._index is not None:
+            pos = self._index.get((curr_row, curr_col))
+            return 0 if pos is None else int(self.vals[pos])
+        # Read-only access binary-searches the sorted keys rather than building the index
+        keys = self._sorted_keys()
+        key = curr_row * self.cols + curr_col
+        pos = int(np.searchsorted(keys, key))
+        return int(self.vals[pos]) if pos < len(keys) and keys[pos] == key else 0
 
     def set_element(self, curr_row, curr_col, value):
         """Set the value at the specified position, removing if value is 0.
@@ -85,22 +313,140 @@ class SparseMatrix:
         Args:
             curr_row (int): Row index.
             curr_col (int): Column index.
-            value (int): Value to set.
+            value (int): Value to set; whole-number floats are accepted.
         
         Raises:
-            ValueError: If indices are out of bounds.
+            ValueError: If indices are out of bounds, or value is not an
+                integer that fits in int64.
         """
         if not (0 <= curr_row < self.rows and 0 <= curr_col < self.cols):
             raise ValueError("Invalid row or column")
-        for i, (row, col, _) in enumerate(self.elements):
-            if row == curr_row and col == curr_col:
-                if value == 0:
-                    self.elements.pop(i)
-                else:
-                    self.elements[i] = (row, col, value)
-                return
-        if value != 0:
-            self.elements.append((curr_row, curr_col, value))
+        if isinstance(value, (float, np.floating)) and float(value).is_integer():
+            value = int(value)
+        if (isinstance(value, (bool, np.bool_)) or not isinstance(value, (int, np.integer))
+                or not -2**63 <= int(value) < 2**63):
+            raise ValueError("Invalid value")
+        value = int(value)
+        self._csr_cache = None
+        index = self._positions()
+        pos = index.get((curr_row, curr_col))
+        if pos is not None:
+            if value == 0:
+                self._keys = None
+                # Move the last element into the freed slot instead of shifting the tail
+                last = len(self.vals) - 1
+                if pos != last:
+                    self.rows_idx[pos] = self.rows_idx[last]
+                    self.cols_idx[pos] = self.cols_idx[last]
+                    self.vals[pos] = self.vals[last]
+                    index[(int(self.rows_idx[pos]), int(self.cols_idx[pos]))] = pos
+                del index[(curr_row, curr_col)]
+                self.rows_idx, self.cols_idx, self.vals = self.rows_idx[:last], self.cols_idx[:last], self.vals[:last]
+            else:
+                self.vals[pos] = value
+        elif value != 0:
+            self._keys = None
+            index[(curr_row, curr_col)] = len(self.vals)
+            self._append(curr_row, curr_col, value)
+
+    def _append(self, row, col, value):
+        """Append one element, growing spare capacity geometrically.
+
+        The arrays are kept as views into over-allocated buffers, so repeated
+        inserts cost amortized O(1) instead of copying every array each time.
+        """
+        n = len(self.vals)
+        buffers = self._buffers
+        if (buffers is None or len(buffers[2]) == n or self.rows_idx.base is not buffers[0]
+                or self.cols_idx.base is not buffers[1] or self.vals.base is not buffers[2]):
+            capacity = max(8, 2 * n)
+            buffers = tuple(np.empty(capacity, dtype=arr.dtype) for arr in (self.rows_idx, self.cols_idx, self.vals))
+            for buf, arr in zip(buffers, (self.rows_idx, self.cols_idx, self.vals)):
+                buf[:n] = arr
+            self._buffers = buffers
+        buffers[0][n], buffers[1][n], buffers[2][n] = row, col, value
+        self.rows_idx, self.cols_idx, self.vals = (buf[:n + 1] for buf in buffers)
+
+    def _coalesce(self):
+        """Sum duplicate (row, col) entries and drop explicit zeros, once.
+
+        Leaves the elements sorted in row-major order. Matrices built by the
+        arithmetic operations are already coalesced and skip this entirely.
+        """
+        if not self._is_coalesced:
+            self.rows_idx, self.cols_idx, self.vals = _merge_coo(self.rows_idx, self.cols_idx, self.vals)
+            self._csr_cache = None
+            self._index = None
+            self._keys = None
+        self._is_coalesced = True
+
+    def _sorted_keys(self):
+        """Return the row-major key of every element, sorting the elements if needed.
+
+        Returns:
+            numpy.ndarray: Strictly increasing int64 keys row * cols + col,
+            aligned with rows_idx, cols_idx and vals.
+        """
+        if self._keys is None:
+            self._coalesce()
+            keys = self.rows_idx.astype(np.int64) * self.cols + self.cols_idx
+            if not (keys[1:] > keys[:-1]).all():
+                order = np.argsort(keys)
+                keys = keys[order]
+                self.rows_idx, self.cols_idx, self.vals = self.rows_idx[order], self.cols_idx[order], self.vals[order]
+                self._index = None
+            self._keys = keys
+        return self._keys
+
+    def _positions(self):
+        """Return the hash index mapping (row, col) to a position in the arrays."""
+        if self._index is None:
+            self._coalesce()
+            self._index = dict(zip(zip(self.rows_idx.tolist(), self.cols_idx.tolist()), range(len(self.vals))))
+        return self._index
+
+    def _csr(self):
+        """Return the matrix in CSR form, building it only if not already cached.
+
+        Returns:
+            tuple: (row_ptr, col_idx, vals) arrays, with the entries of row i
+            stored in col_idx[row_ptr[i]:row_ptr[i + 1]].
+        """
+        if self._csr_cache is None:
+            if self._keys is not None:
+                # Already in row-major order, so no sort is needed
+                rows_idx, cols_idx, vals = self.rows_idx, self.cols_idx, self.vals
+            else:
+                order = np.lexsort((self.cols_idx, self.rows_idx))
+                rows_idx, cols_idx, vals = self.rows_idx[order], self.cols_idx[order], self.vals[order]
+            row_ptr = np.searchsorted(rows_idx, np.arange(self.rows + 1))
+            if len(vals) <= np.iinfo(self.index_dtype).max:
+                row_ptr = row_ptr.astype(self.index_dtype)
+            self._csr_cache = (row_ptr, cols_idx, vals)
+        return self._csr_cache
+
+    def _classify(self):
+        """Detect structure that lets multiply avoid the general SpGEMM kernel.
+
+        Returns:
+            str: One of _DIAG, _PERMUTATION or _GENERAL.
+        """
+        self._coalesce()
+        if (self.rows_idx == self.cols_idx).all():
+            return _DIAG
+        if (np.bincount(self.rows_idx, minlength=self.rows).max(initial=0) <= 1
+                and np.bincount(self.cols_idx, minlength=self.cols).max(initial=0) <= 1):
+            return _PERMUTATION
+        return _GENERAL
+
+    def _iter_elements(self):
+        """Yield (row, col, value) for each stored non-zero element as Python ints.
+
+        Duplicates and explicit zeros are coalesced first, so each coordinate
+        appears at most once.
+        """
+        self._coalesce()
+        return zip(self.rows_idx.tolist(), self.cols_idx.tolist(), self.vals.tolist())
 
     def add(self, other):
         """Add two sparse matrices.
@@ -114,15 +460,7 @@ class SparseMatrix:
         Returns:
             SparseMatrix: Result of addition.
         """
-        if self.rows != other.rows or self.cols != other.cols:
-            raise ValueError("Matrix dimensions do not match for addition")
-        result = SparseMatrix(num_rows=self.rows, num_cols=self.cols)
-        for row, col, value in self.elements:
-            result.set_element(row, col, value)
-        for row, col, value in other.elements:
-            current_val = result.get_element(row, col)
-            result.set_element(row, col, current_val + value)
-        return result
+        return self._axpy(other, 1, "addition")
 
     def subtract(self, other):
         """Subtract two sparse matrices.
@@ -136,14 +474,39 @@ class SparseMatrix:
         Returns:
             SparseMatrix: Result of subtraction.
         """
+        return self._axpy(other, -1, "subtraction")
+
+    def axpy(self, other, alpha):
+        """Compute self + alpha * other in a single merge.
+        
+        Args:
+            other (SparseMatrix): Another sparse matrix.
+            alpha (int): Scale factor applied to other.
+        
+        Raises:
+            ValueError: If alpha is not an integer or dimensions do not match.
+        
+        Returns:
+            SparseMatrix: Result of the scaled addition.
+        """
+        if isinstance(alpha, (float, np.floating)) and float(alpha).is_integer():
+            alpha = int(alpha)
+        if isinstance(alpha, (bool, np.bool_)) or not isinstance(alpha, (int, np.integer)):
+            raise ValueError("alpha must be an integer")
+        return self._axpy(other, alpha, "addition")
+
+    def _axpy(self, other, alpha, operation):
+        """Shared implementation of add, subtract and axpy.
+
+        Concatenates both operands and sums coinciding entries with _merge_coo.
+        """
         if self.rows != other.rows or self.cols != other.cols:
-            raise ValueError("Matrix dimensions do not match for subtraction")
-        result = SparseMatrix(num_rows=self.rows, num_cols=self.cols)
-        for row, col, value in self.elements:
-            result.set_element(row, col, value)
-        for row, col, value in other.elements:
-            current_val = result.get_element(row, col)
-            result.set_element(row, col, current_val - value)
+            raise ValueError(f"Matrix dimensions do not match for {operation}")
+        result = SparseMatrix(num_rows=self.rows, num_cols=self.cols, index_dtype=self.index_dtype)
+        result.rows_idx, result.cols_idx, result.vals = _merge_coo(
+            np.concatenate([self.rows_idx, other.rows_idx], dtype=self.index_dtype),
+            np.concatenate([self.cols_idx, other.cols_idx], dtype=self.index_dtype),
+            np.concatenate([self.vals, other.vals if alpha == 1 else alpha * other.vals]))
         return result
 
     def multiply(self, other):
@@ -160,12 +523,70 @@ class SparseMatrix:
         """
         if self.cols != other.rows:
             raise ValueError("Matrix dimensions do not match for multiplication")
-        result = SparseMatrix(num_rows=self.rows, num_cols=other.cols)
-        for i1, j1, v1 in self.elements:
-            for i2, j2, v2 in other.elements:
-                if j1 == i2:  # Matching columns and rows for multiplication
-                    current_val = result.get_element(i1, j2)
-                    result.set_element(i1, j2, current_val + (v1 * v2))
+        result = SparseMatrix(num_rows=self.rows, num_cols=other.cols, index_dtype=self.index_dtype)
+
+        # Diagonal and permutation operands map each entry of the other
+        # matrix to at most one output entry, so skip the general kernel.
+        self._coalesce()
+        other_kind = other._classify()
+        if other_kind == _DIAG:
+            scale = np.zeros(other.rows, dtype=np.int64)
+            scale[other.rows_idx] = other.vals
+            new_vals = self.vals * scale[self.cols_idx]
+            keep = new_vals != 0
+            result.rows_idx, result.cols_idx, result.vals = self.rows_idx[keep], self.cols_idx[keep], new_vals[keep]
+            return result
+        if other_kind == _PERMUTATION:
+            col_map = np.full(other.rows, -1, dtype=np.int64)
+            col_map[other.rows_idx] = other.cols_idx
+            scale = np.zeros(other.rows, dtype=np.int64)
+            scale[other.rows_idx] = other.vals
+            new_cols = col_map[self.cols_idx]
+            keep = new_cols >= 0
+            result.rows_idx = self.rows_idx[keep]
+            result.cols_idx = new_cols[keep].astype(self.index_dtype)
+            result.vals = self.vals[keep] * scale[self.cols_idx[keep]]
+            return result
+        self_kind = self._classify()
+        if self_kind == _DIAG:
+            scale = np.zeros(self.cols, dtype=np.int64)
+            scale[self.cols_idx] = self.vals
+            new_vals = other.vals * scale[other.rows_idx]
+            keep = new_vals != 0
+            result.rows_idx = other.rows_idx[keep].astype(self.index_dtype, copy=False)
+            result.cols_idx = other.cols_idx[keep].astype(self.index_dtype, copy=False)
+            result.vals = new_vals[keep]
+            return result
+        if self_kind == _PERMUTATION:
+            row_map = np.full(self.cols, -1, dtype=np.int64)
+            row_map[self.cols_idx] = self.rows_idx
+            scale = np.zeros(self.cols, dtype=np.int64)
+            scale[self.cols_idx] = self.vals
+            new_rows = row_map[other.rows_idx]
+            keep = new_rows >= 0
+            result.rows_idx = new_rows[keep].astype(self.index_dtype)
+            result.cols_idx = other.cols_idx[keep].astype(self.index_dtype, copy=False)
+            result.vals = other.vals[keep] * scale[other.rows_idx[keep]]
+            return result
+
+        a_rp, a_ci, a_v = self._csr()
+        b_rp, b_ci, b_v = other._csr()
+        index_dtypes = {a_rp.dtype, a_ci.dtype, b_rp.dtype, b_ci.dtype}
+        if (_kernels is not None and len(index_dtypes) == 1
+                and index_dtypes <= {np.dtype(np.int32), np.dtype(np.int64)}
+                and a_v.dtype == b_v.dtype == np.int64):
+            # The C kernel needs no JIT warm-up, so it is preferred when built.
+            # It is only compiled for int32 and int64 indices and int64 values.
+            row_ptr, out_col, out_val = _kernels.spgemm_csr(a_rp, a_ci, a_v, b_rp, b_ci, b_v, other.cols)
+        elif _HAVE_NUMBA:
+            n_chunks = max(1, min(self.rows, 4 * get_num_threads()))
+            row_ptr, out_col, out_val = _spgemm_csr(a_rp, a_ci, a_v, b_rp, b_ci, b_v, other.cols, n_chunks)
+        else:
+            row_ptr, out_col, out_val = _spgemm_csr_py(a_rp, a_ci, a_v, b_rp, b_ci, b_v)
+        out_row = np.repeat(np.arange(self.rows, dtype=self.index_dtype), np.diff(row_ptr))
+        keep = out_val != 0
+        result.rows_idx, result.cols_idx, result.vals = (
+            out_row[keep], out_col[keep].astype(self.index_dtype, copy=False), out_val[keep])
         return result
 
     def save_to_file(self, output_file_path):
@@ -175,11 +596,9 @@ class SparseMatrix:
             output_file_path (str): Path to the output file.
         """
         output_file_path = output_file_path.strip()  # Ensure no spaces in output path
+        entries = "".join([f"({row}, {col}, {value})\n" for row, col, value in self._iter_elements()])
         with open(output_file_path, 'w') as file:
-            file.write(f"rows={self.rows}\n")
-            file.write(f"cols={self.cols}\n")
-            for row, col, value in self.elements:
-                file.write(f"({row}, {col}, {value})\n")
+            file.write(f"rows={self.rows}\ncols={self.cols}\n{entries}")
 
 def main():
     """Main function to handle user interaction and matrix operations."""